@@ -1,12 +1,23 @@
 import datetime
+import html
 import json
+from collections import defaultdict
 from pathlib import Path
+from typing import BinaryIO
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Indentation strings for the usual nesting depths, so they are not rebuilt per folder
+_INDENTS: tuple = tuple("\t" * i for i in range(64))
 
 
 def main() -> None:
     data: dict = read_json()
-    html: str = convert_json_to_html(data)
-    write_html(html)
+    bookmarks: dict = convert_json_to_bookmarks(data)
+    write_html(bookmarks)
 
     print("Done!")
 
@@ -19,9 +30,10 @@ def read_json() -> dict:
     data: dict = {}
 
     if filename.exists():
-        with filename.open("r", encoding="utf-8") as f:
-            print(f"> Found {filename} in the current directory.")
-            data = json.load(f)
+        print(f"> Found {filename} in the current directory.")
+        content: bytes = filename.read_bytes()
+        # orjson is optional; fall back to the standard library parser if it is missing
+        data = orjson.loads(content) if orjson is not None else json.loads(content)
     else:
         print('> File not found. Look for the "StorableSidebar.json" file in the current directory.')
         raise FileNotFoundError
@@ -29,26 +41,35 @@ def read_json() -> dict:
     return data
 
 
-def convert_json_to_html(json_data: dict) -> str:
+def convert_json_to_bookmarks(json_data: dict) -> dict:
     containers: list = json_data["sidebar"]["containers"]
-    target: int = sum([1 for i in containers if "global" in i])
+    target: dict = next(
+        (c for c in containers if type(c) is dict and "spaces" in c and "items" in c), None
+    )
+
+    if target is None:
+        print("> No container with spaces and items found in the sidebar.")
+        raise ValueError
 
-    spaces: dict = get_spaces(json_data["sidebar"]["containers"][target]["spaces"])
-    items: list = json_data["sidebar"]["containers"][target]["items"]
+    print(f"> Found {len(target['items'])} items.")
 
-    bookmarks: dict = convert_to_bookmarks(spaces, items)
-    html_content: str = convert_bookmarks_to_html(bookmarks)
+    spaces: dict = get_spaces(target["spaces"])
+    items: list = target["items"]
 
-    return html_content
+    return convert_to_bookmarks(spaces, items)
 
 
 def get_spaces(spaces: list) -> dict:
     print("Getting spaces...")
 
-    spaces_names: dict = {"pinned": {}, "unpinned": {}}
+    # Only pinned containers are exported, so unpinned ones are not collected
+    spaces_names: dict = {"pinned": {}}
     spaces_count: int = 0
     n: int = 1
 
+    # Only dict entries describe a space; the rest of the list is bare IDs
+    spaces = [space for space in spaces if type(space) is dict]
+
     for space in spaces:
         if "title" in space:
             title: str = space["title"]
@@ -56,17 +77,14 @@ def get_spaces(spaces: list) -> dict:
             title: str = "Space " + str(n)
             n += 1
 
-        if isinstance(space, dict):
-            containers: list = space["newContainerIDs"]
+        containers: list = space["newContainerIDs"]
 
-            for i in range(len(containers)):
-                if isinstance(containers[i], dict):
-                    if "pinned" in containers[i]:
-                        spaces_names["pinned"][str(containers[i + 1])] = title
-                    elif "unpinned" in containers[i]:
-                        spaces_names["unpinned"][str(containers[i + 1])] = title
+        # Each container marker dict is followed by the ID of the container it describes
+        for marker, container_id in zip(containers, containers[1:]):
+            if type(marker) is dict and "pinned" in marker:
+                spaces_names["pinned"][str(container_id)] = title
 
-            spaces_count += 1
+        spaces_count += 1
 
     print(f"> Found {spaces_count} spaces.")
 
@@ -78,82 +96,120 @@ def convert_to_bookmarks(spaces: dict, items: list) -> dict:
 
     bookmarks: dict = {"bookmarks": []}
     bookmarks_count: int = 0
-    item_dict: dict = {item["id"]: item for item in items if isinstance(item, dict)}
-
-    def recurse_into_children(parent_id: str) -> list:
-        nonlocal bookmarks_count
-        children: list = []
-        for item_id, item in item_dict.items():
-            if item.get("parentID") == parent_id:
-                if "data" in item and "tab" in item["data"]:
-                    children.append(
-                        {
-                            "title": item.get("title", None)
-                            or item["data"]["tab"].get("savedTitle", ""),
-                            "type": "bookmark",
-                            "url": item["data"]["tab"].get("savedURL", ""),
-                        }
-                    )
-                    bookmarks_count += 1
-                elif "title" in item:
-                    child_folder: dict = {
-                        "title": item["title"],
-                        "type": "folder",
-                        "children": recurse_into_children(item_id),
-                    }
-                    children.append(child_folder)
-        return children
 
+    # Classify every item once into a small record and index it by parent, so
+    # building the tree below only has to look up records instead of
+    # re-inspecting the raw JSON
+    rendered: dict = {}
+    children_by_parent: defaultdict = defaultdict(list)
+    append = list.append
+    for item in items:
+        if type(item) is not dict:
+            continue
+        data: dict = item.get("data")
+        tab: dict = data.get("tab") if data else None
+        if tab is not None:
+            title: str = item.get("title") or tab.get("savedTitle", "")
+            record: tuple = ("bookmark", title, tab.get("savedURL", ""))
+        elif "title" in item:
+            record: tuple = ("folder", item["title"])
+        else:
+            continue
+        item_id: str = item["id"]
+        rendered[item_id] = record
+        append(children_by_parent[item.get("parentID")], item_id)
+
+    # Build the tree with an explicit stack of (parent's children list, item ID)
+    # pairs so deep folder hierarchies cannot hit the recursion limit
+    stack: list = []
     for space_id, space_name in spaces["pinned"].items():
-        space_folder: dict = {
-            "title": space_name,
-            "type": "folder",
-            "children": recurse_into_children(space_id),
-        }
+        space_folder: dict = {"title": space_name, "type": "folder", "children": []}
         bookmarks["bookmarks"].append(space_folder)
+        stack.extend(
+            (space_folder["children"], child_id)
+            for child_id in reversed(children_by_parent.get(space_id, ()))
+        )
+
+        while stack:
+            siblings, item_id = stack.pop()
+            record: tuple = rendered[item_id]
+            if record[0] == "folder":
+                folder: dict = {"title": record[1], "type": "folder", "children": []}
+                siblings.append(folder)
+                stack.extend(
+                    (folder["children"], child_id)
+                    for child_id in reversed(children_by_parent.get(item_id, ()))
+                )
+            else:
+                siblings.append({"title": record[1], "type": "bookmark", "url": record[2]})
+                bookmarks_count += 1
 
     print(f"> Found {bookmarks_count} bookmarks.")
 
     return bookmarks
 
 
-def convert_bookmarks_to_html(bookmarks: dict) -> str:
-    print("Converting bookmarks to HTML...")
-
-    html_str: str = """<!DOCTYPE NETSCAPE-Bookmark-file-1>
+def write_bookmarks_html(bookmarks: dict, f: BinaryIO) -> None:
+    header: bytes = b"""<!DOCTYPE NETSCAPE-Bookmark-file-1>
 <META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">
 <TITLE>Bookmarks</TITLE>
 <H1>Bookmarks</H1>
 <DL><p>"""
 
-    def traverse_dict(d: dict, html_str: str, level: int) -> str:
-        indent: str = "\t" * level
-        for item in d:
+    write = f.write
+
+    # Walk the tree with an explicit stack so deep folder hierarchies cannot hit the
+    # recursion limit. Each fragment is encoded and goes straight to the file instead
+    # of being collected into one large string first.
+    def traverse_dict(d: list, level: int) -> None:
+        # Each entry carries its indent string, so it is looked up once per folder
+        indent: str = _INDENTS[level] if level < 64 else "\t" * level
+        stack: list = [(item, level, indent, "enter") for item in reversed(d)]
+        while stack:
+            item, level, indent, phase = stack.pop()
             if item["type"] == "folder":
-                html_str += f'\n{indent}<DT><H3>{item["title"]}</H3>'
-                html_str += f"\n{indent}<DL><p>"
-                html_str = traverse_dict(item["children"], html_str, level + 1)
-                html_str += f"\n{indent}</DL><p>"
+                if phase == "exit":
+                    write(f"\n{indent}</DL><p>".encode("utf-8"))
+                    continue
+                title: str = html.escape(item["title"], quote=False)
+                write(f"\n{indent}<DT><H3>{title}</H3>\n{indent}<DL><p>".encode("utf-8"))
+                stack.append((item, level, indent, "exit"))
+                child_level: int = level + 1
+                child_indent: str = _INDENTS[child_level] if child_level < 64 else "\t" * child_level
+                stack.extend(
+                    (child, child_level, child_indent, "enter")
+                    for child in reversed(item["children"])
+                )
             elif item["type"] == "bookmark":
-                html_str += f'\n{indent}<DT><A HREF="{item["url"]}">{item["title"]}</A>'
-        return html_str
-
-    html_str = traverse_dict(bookmarks["bookmarks"], html_str, 1)
-    html_str += "\n</DL><p>"
-
-    print("> HTML converted.")
+                title: str = html.escape(item["title"], quote=False)
+                # Only the double quotes delimiting HREF need escaping; leave ' untouched
+                url: str = html.escape(item["url"], quote=False).replace('"', "&quot;")
+                write(f'\n{indent}<DT><A HREF="{url}">{title}</A>'.encode("utf-8"))
 
-    return html_str
+    write(header)
+    traverse_dict(bookmarks["bookmarks"], 1)
+    write(b"\n</DL><p>")
 
 
-def write_html(html_content: str) -> None:
+def write_html(bookmarks: dict) -> None:
     print("Writing HTML...")
 
     current_date: str = datetime.datetime.now().strftime("%Y_%m_%d")
     output_file: Path = Path("arc_bookmarks_" + current_date).with_suffix(".html")
 
-    with output_file.open("w", encoding="utf-8") as f:
-        f.write(html_content)
+    # Render into a temporary file and only move it into place once it is complete,
+    # so a failure part-way through never leaves a truncated bookmarks file behind
+    partial_file: Path = output_file.with_suffix(".html.part")
+
+    try:
+        # Write pre-encoded bytes through a large buffer to keep the number of writes low
+        with partial_file.open("wb", buffering=1 << 20) as f:
+            write_bookmarks_html(bookmarks, f)
+    except BaseException:
+        partial_file.unlink(missing_ok=True)
+        raise
+
+    partial_file.replace(output_file)
 
     print(f"> HTML written to {output_file}.")
 